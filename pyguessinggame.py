@@ -1,13 +1,19 @@
 import asyncio
+import atexit
+import contextlib
 import os
 import logging
 import httpx
 import json
 import random
+from collections import defaultdict
 from datetime import datetime
+from functools import lru_cache
+from operator import itemgetter
 from typing import List, Dict, Optional
 from telegram import Update, InputFile, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
+    AIORateLimiter,
     Application,
     CommandHandler,
     MessageHandler,
@@ -15,7 +21,7 @@ from telegram.ext import (
     filters,
     CallbackContext,
 )
-from telegram.error import TelegramError
+from telegram.error import BadRequest, TelegramError
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -27,12 +33,18 @@ PYDATA_DIR = os.path.join(BASE_DIR, 'Pydata')
 QUIZJOIN_PATH = os.path.join(PYDATA_DIR, 'guessjoin.txt')
 PUZZLE_PATH = os.path.join(PYDATA_DIR, '4images.json')
 IMAGES_DIR = os.path.join(PYDATA_DIR, '4images')
+IMAGE_IDS_PATH = os.path.join(PYDATA_DIR, '4images_fileids.json')
 
 # Other existing constants remain the same
-AUTHORIZED_ADMINS = ["chicago311", "LesterRonquillo", "Aldrin1212"]
+# Lowercased, since Telegram usernames are case-insensitive
+AUTHORIZED_ADMINS = frozenset(name.lower() for name in ("chicago311", "LesterRonquillo", "Aldrin1212"))
 POINTS_PER_CORRECT_ANSWER = 5
 HINT_PENALTY = 1
 MAX_HINTS = 4  # Maximum number of hints allowed per puzzle
+FLUSH_INTERVAL = 5  # Seconds between participant file flushes
+NEXT_GAME_DELAY = 60  # Seconds between a correct answer and the next puzzle
+MEDAL_POSITIONS = ("🥇 1ˢᵗ", "🥈 2ⁿᵈ", "🥉 3ʳᵈ")
+PUZZLE_CAPTION = "🎯 Guess the image!\n\nUse /hint if you need help with panalty. \n Join Now! /join_participate "
 
 # Configure logging with directory creation
 os.makedirs(BASE_DIR, exist_ok=True)  # Ensure base directory exists
@@ -51,12 +63,47 @@ logger = logging.getLogger(__name__)
 for logger_name in ["httpx", "telegram.ext._network"]:
     logging.getLogger(logger_name).setLevel(logging.WARNING)
 
+class _VowelMask(dict):
+    """str.translate table that keeps lowercase vowels and masks everything else."""
+    def __missing__(self, ordinal: int) -> str:
+        return '_'
+
+VOWEL_MASK_TABLE = _VowelMask({ord(c): c for c in 'aeiou'})
+
+def read_json(path: str):
+    """Read and parse a JSON file."""
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def write_json_atomic(path: str, data) -> None:
+    """Write JSON to a temporary file, then replace the target with it."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        # Compact output; the files are only read back by the bot
+        json.dump(data, file, separators=(',', ':'), ensure_ascii=False)
+    os.replace(temp_path, path)
+
+@lru_cache(maxsize=32)
+def read_image(image_path: str) -> bytes:
+    """Read an image file, keeping recently used images in memory."""
+    with open(image_path, 'rb') as img:
+        return img.read()
+
 class QuizGame:
     def __init__(self):
         self.game_active: bool = False
         self.current_puzzle: Optional[Dict] = None
-        self.puzzle_data: List[Dict] = []
+        self.puzzle_data: List[Dict] = []  # Loaded once and never mutated
+        self._puzzle_order: List[int] = []  # Shuffled indexes into puzzle_data
+        self._puzzle_cursor: int = 0
         self.hints_given: int = 0
+        self.participants: Dict[str, Dict] = {}
+        self._dirty: bool = False
+        self._flush_lock = asyncio.Lock()  # Keeps background writes in order
+        self._ranking: Optional[List[Dict]] = None  # Cached leaderboard order
+        self._ranks: Dict[str, int] = {}
+        self._active_players: int = 0
+        self.image_file_ids: Dict[str, str] = {}  # Telegram file_id per uploaded image
         self.setup_files()
 
     def setup_files(self) -> None:
@@ -65,8 +112,7 @@ class QuizGame:
         os.makedirs(PYDATA_DIR, exist_ok=True)
         
         if not os.path.exists(QUIZJOIN_PATH):
-            with open(QUIZJOIN_PATH, 'w') as file:
-                json.dump([], file, indent=4)
+            write_json_atomic(QUIZJOIN_PATH, [])
             logger.info(f"Created {QUIZJOIN_PATH}")
 
         for required_path in [PUZZLE_PATH, IMAGES_DIR]:
@@ -74,78 +120,196 @@ class QuizGame:
                 raise FileNotFoundError(f"Required path not found: {required_path}")
 
         self.puzzle_data = self.load_puzzle()
+        self.participants = self.read_participate()
+        self.image_file_ids = self.read_image_file_ids()
 
     @staticmethod
-    def load_participate() -> List[Dict]:
-        """Load participants data from file."""
+    def read_participate() -> Dict[str, Dict]:
+        """Read participants data from file, keyed by username."""
         try:
-            with open(QUIZJOIN_PATH, 'r') as file:
-                participants = json.load(file)
-                # Ensure all participants have required fields
-                for p in participants:
-                    if 'username' not in p:
-                        continue
-                    p.setdefault('score', 0)
-                    p.setdefault('full_name', p.get('username', 'Unknown'))
-                    p.setdefault('join_date', datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-                return participants
+            participants = read_json(QUIZJOIN_PATH)
+            return {
+                p['username']: QuizGame._normalize(p)
+                for p in participants if 'username' in p
+            }
         except (json.JSONDecodeError, FileNotFoundError) as e:
             logger.error(f"Error loading participants: {e}")
-            return []
-
+            return {}
 
     @staticmethod
-    def save_participate(users: List[Dict]) -> None:
-        """Save participants data to file."""
+    def _normalize(participant: Dict) -> Dict:
+        """Ensure a participant record has all required fields."""
+        participant['score'] = int(participant.get('score', 0))  # Ensure score is an integer
+        participant.setdefault('full_name', participant['username'])
+        participant.setdefault('join_date', datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        return participant
+
+    def save_participate(self, users: Dict[str, Dict]) -> None:
+        """Replace participants data; the file is written on the next flush."""
+        self.participants = users
+        self.mark_dirty()
+
+    def add_participant(self, participant: Dict) -> None:
+        """Add a new participant record."""
+        self.participants[participant['username']] = self._normalize(participant)
+        self.mark_dirty()
+
+    def mark_dirty(self) -> None:
+        """Record an in-place change to participants for the next flush."""
+        self._dirty = True
+        self._ranking = None
+
+    def add_score(self, username: str, points: int) -> int:
+        """Add points to a participant's score and return the new total."""
+        participant = self.participants[username]
+        participant['score'] += points
+        self.mark_dirty()
+        return participant['score']
+
+    def get_ranking(self) -> List[Dict]:
+        """Return participants sorted by score, highest first."""
+        if self._ranking is None:
+            self._ranking = sorted(self.participants.values(), key=itemgetter('score'), reverse=True)
+            self._ranks = {}
+            self._active_players = 0
+            for i, p in enumerate(self._ranking, 1):
+                self._ranks[p['username']] = i
+                if p['score'] > 0:
+                    self._active_players += 1
+        return self._ranking
+
+    def get_rank(self, username: str) -> int:
+        """Return the 1-based leaderboard position of a participant."""
+        if self._ranking is not None:
+            return self._ranks[username]
+
+        # No cached order (e.g. right after a score change): count the players
+        # ranked ahead instead of re-sorting. Ties keep insertion order, as the
+        # stable sort in get_ranking does.
+        score = self.participants[username]['score']
+        rank = 1
+        before = True
+        for name, p in self.participants.items():
+            if name == username:
+                before = False
+            elif p['score'] > score or (before and p['score'] == score):
+                rank += 1
+        return rank
+
+    def get_active_players(self) -> int:
+        """Return how many participants have scored points."""
+        self.get_ranking()
+        return self._active_players
+
+    def snapshot_participate(self) -> Optional[List[Dict]]:
+        """Return participants data for writing if it changed since the last flush."""
+        if not self._dirty:
+            return None
+        self._dirty = False
+        # Records only change in place from here on, never in size, so the
+        # writer thread can serialize them without copying
+        return list(self.participants.values())
+
+    def flush_participate(self) -> None:
+        """Write participants data to file if it changed since the last flush."""
+        users = self.snapshot_participate()
+        if users is not None:
+            self.write_participate(users)
+
+    async def flush_participate_async(self) -> None:
+        """Like flush_participate, but writes the file in a worker thread."""
+        async with self._flush_lock:
+            users = self.snapshot_participate()
+            if users is not None:
+                write = asyncio.ensure_future(asyncio.to_thread(self.write_participate, users))
+                try:
+                    await asyncio.shield(write)
+                except asyncio.CancelledError:
+                    # The thread keeps running; hold the lock until it is done
+                    await write
+                    raise
+
+    def write_participate(self, users: List[Dict]) -> None:
+        """Write a participants snapshot to file."""
         try:
             # Ensure the directory exists
             os.makedirs(os.path.dirname(QUIZJOIN_PATH), exist_ok=True)
             
-            # Ensure all required fields are present before saving
-            for user in users:
-                if 'username' not in user:
-                    continue
-                user['score'] = int(user.get('score', 0))  # Ensure score is an integer
-                user.setdefault('full_name', user.get('username', 'Unknown'))
-                user.setdefault('join_date', datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-            
-            # Write to a temporary file first
-            temp_path = f"{QUIZJOIN_PATH}.tmp"
-            with open(temp_path, 'w') as file:
-                json.dump(users, file, indent=4)
-            
-            # Replace the original file with the temporary file
-            os.replace(temp_path, QUIZJOIN_PATH)
+            # Write to a temporary file, then replace the original with it
+            write_json_atomic(QUIZJOIN_PATH, users)
             
             logger.info("Participants saved successfully")
         except Exception as e:
+            self._dirty = True
             logger.error(f"Error saving participants: {e}")
             raise
 
+    @staticmethod
+    def read_image_file_ids() -> Dict[str, str]:
+        """Read cached Telegram file_ids of uploaded images."""
+        if not os.path.exists(IMAGE_IDS_PATH):
+            return {}
+        try:
+            return read_json(IMAGE_IDS_PATH)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error(f"Error loading image file ids: {e}")
+            return {}
+
+    def save_image_file_ids(self) -> None:
+        """Save cached Telegram file_ids of uploaded images."""
+        try:
+            write_json_atomic(IMAGE_IDS_PATH, dict(self.image_file_ids))
+        except Exception as e:
+            logger.error(f"Error saving image file ids: {e}")
+
     def load_puzzle(self) -> List[Dict]:
         """Load puzzle data from file."""
         try:
-            with open(PUZZLE_PATH, 'r') as file:
-                return json.load(file)
+            puzzles = read_json(PUZZLE_PATH)
         except Exception as e:
             logger.error(f"Error loading puzzles: {e}")
             return []
 
-    def get_hint(self) -> str:
-        """Generate a hint for the current puzzle."""
-        if not self.current_puzzle:
-            return "No active puzzle!"
+        for puzzle in puzzles:
+            self.prepare_puzzle(puzzle)
+        return puzzles
 
-        answer = os.path.splitext(self.current_puzzle['image'])[0]
-        if self.hints_given == 0:
+    @staticmethod
+    def prepare_puzzle(puzzle: Dict) -> None:
+        """Precompute the answer and hints of a puzzle from its image name."""
+        answer = os.path.splitext(puzzle['image'])[0]
+        every_other = ['_'] * len(answer)
+        every_other[::2] = answer[::2]
+        puzzle['answer_lower'] = answer.lower()
+        puzzle['hints'] = (
             # First hint: Show length and first letter
-            hint = f"Length: {len(answer)} letters\nFirst letter: {answer[0]}"
-        elif self.hints_given == 1:
+            f"Length: {len(answer)} letters\nFirst letter: {answer[0]}",
             # Second hint: Show vowels
-            hint = ''.join('_' if c not in 'aeiou' else c for c in answer)
-        else:
+            answer.translate(VOWEL_MASK_TABLE),
             # Final hint: Show every other letter
-            hint = ''.join(c if i % 2 == 0 else '_' for i, c in enumerate(answer))
+            ''.join(every_other),
+        )
+
+    def shuffle_puzzles(self) -> None:
+        """Start a new pass over all puzzles in random order."""
+        self._puzzle_order = random.sample(range(len(self.puzzle_data)), k=len(self.puzzle_data))
+        self._puzzle_cursor = 0
+
+    def next_puzzle(self) -> Optional[Dict]:
+        """Return the next puzzle of the current pass, or None when all were used."""
+        if self._puzzle_cursor >= len(self._puzzle_order):
+            return None
+        puzzle = self.puzzle_data[self._puzzle_order[self._puzzle_cursor]]
+        self._puzzle_cursor += 1
+        return puzzle
+
+    def get_hint(self) -> str:
+        """Return the next hint for the current puzzle."""
+        if not self.current_puzzle:
+            return "No active puzzle!"
+
+        hints = self.current_puzzle['hints']
+        hint = hints[min(self.hints_given, len(hints) - 1)]
         
         self.hints_given += 1
         return hint
@@ -154,7 +318,10 @@ class QuizBot:
     def __init__(self, token: str):
         self.token = token
         self.quiz_game = QuizGame()
-        self.next_game_task = None  # Track the scheduled next game task
+        self.flush_task = None  # Periodic participant file flush
+        self.chat_locks: Dict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+        atexit.register(self.quiz_game.flush_participate)
+        atexit.register(self.quiz_game.save_image_file_ids)
 
     async def start(self, update: Update, context: CallbackContext) -> None:
         """Handle the /startpalaro command."""
@@ -190,10 +357,10 @@ class QuizBot:
     async def join_participate(self, update: Update, context: CallbackContext) -> None:
         """Handle the /join_participate command with beautiful but simple formatting."""
         user = update.message.from_user
-        participants = self.quiz_game.load_participate()
+        participants = self.quiz_game.participants
     
     # Check if user is already participating
-        if any(p['username'] == user.username for p in participants):
+        if user.username in participants:
             already_joined = (
                 f"@{user.username}, you're in the game!\n\n"
                 "• /scores - View rankings\n"
@@ -211,8 +378,7 @@ class QuizBot:
             "score": 0,
             "join_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
-        participants.append(new_participant)
-        self.quiz_game.save_participate(participants)
+        self.quiz_game.add_participant(new_participant)
     
         welcome_message = (
             f"@{user.username}, ready to play?\n\n"
@@ -250,55 +416,47 @@ class QuizBot:
 
     async def scores(self, update: Update, context: CallbackContext) -> None:
         """Handle the /scores command with beautiful formatting."""
-        participants = self.quiz_game.load_participate()
+        await update.message.reply_text(self.format_leaderboard())
+
+    def format_leaderboard(self) -> str:
+        """Build the leaderboard text shown by /scores and at game end."""
+        participants = self.quiz_game.participants
         if not participants:
-            await update.message.reply_text("No participants yet! 🎮\nJoin with /join_participate")
-            return
+            return "No participants yet! 🎮\nJoin with /join_participate"
 
         # Sort participants by score and get top 10
-        sorted_participants = sorted(participants, key=lambda x: x.get('score', 0), reverse=True)
+        sorted_participants = self.quiz_game.get_ranking()
         top_10 = sorted_participants[:10]
 
         # Calculate statistics
         total_players = len(participants)
-        active_players = sum(1 for p in participants if p.get('score', 0) > 0)
+        active_players = self.quiz_game.get_active_players()
         highest_score = top_10[0].get('score', 0) if top_10 else 0
 
-        # Position suffixes
-        suffixes = {
-            1: "ˢᵗ", 2: "ⁿᵈ", 3: "ʳᵈ"
-        }
-
         # Create leaderboard text
-        leaderboard = "🏆 LEADERBOARD 🏆\n"
-        leaderboard += "━━━━━━━━━━━━━━━━━━\n"
+        parts: List[str] = ["🏆 LEADERBOARD 🏆", "━━━━━━━━━━━━━━━━━━"]
 
         for i, p in enumerate(top_10, 1):
-            username = p.get('username', 'Unknown')
-            score = p.get('score', 0)
-
-            # Determine position formatting
-            if i <= 3:
-                medal = ["🥇", "🥈", "🥉"][i-1]
-                position = f"{medal} {i}{suffixes.get(i, 'ᵗʰ')}"
-            else:
-                position = f"🎯 {i}ᵗʰ"
+            # Medals for the top 3, a target for everyone else
+            position = MEDAL_POSITIONS[i - 1] if i <= 3 else f"🎯 {i}ᵗʰ"
 
             # Format each line with proper spacing
-            leaderboard += f"{position} │ @{username} │ {score} pts\n"
-
-        leaderboard += "\n━━━━━━━━━━━━━━━━━━\n"
-
-        # Add statistics
-        leaderboard += "📊 Statistics:\n"
-        leaderboard += f"- Total Players: {total_players}\n"
-        leaderboard += f"- Active Players: {active_players}\n"
-        leaderboard += f"- Highest Score: {highest_score} pts\n\n"
-
-        # Add call to action
-        leaderboard += "💡 Join with /join_participate"
+            parts.append(f"{position} │ @{p.get('username', 'Unknown')} │ {p.get('score', 0)} pts")
+
+        parts += [
+            "",
+            "━━━━━━━━━━━━━━━━━━",
+            # Add statistics
+            "📊 Statistics:",
+            f"- Total Players: {total_players}",
+            f"- Active Players: {active_players}",
+            f"- Highest Score: {highest_score} pts",
+            "",
+            # Add call to action
+            "💡 Join with /join_participate",
+        ]
 
-        await update.message.reply_text(leaderboard)
+        return '\n'.join(parts)
 
    
    #-------------------------------------------------------------------------------
@@ -342,7 +500,7 @@ class QuizBot:
             return
 
         self.quiz_game.game_active = True
-        random.shuffle(self.quiz_game.puzzle_data)
+        self.quiz_game.shuffle_puzzles()
         self.quiz_game.hints_given = 0
         
         # Send and pin the start message
@@ -353,15 +511,21 @@ class QuizBot:
             ]])
         )
         
-        # Pin the message
+        # Pin the message in the background
+        context.application.create_task(
+            self.pin_message(context, update.effective_chat.id, start_message.message_id)
+        )
+
+    async def pin_message(self, context: CallbackContext, chat_id: int, message_id: int) -> None:
+        """Pin a message silently, logging instead of raising on failure."""
         try:
             await context.bot.pin_chat_message(
-                chat_id=update.effective_chat.id,
-                message_id=start_message.message_id,
+                chat_id=chat_id,
+                message_id=message_id,
                 disable_notification=True
             )
         except TelegramError as e:
-            logger.error(f"Failed to pin start game message: {e}")
+            logger.error(f"Failed to pin message {message_id}: {e}")
 
     #-------------------------------------------------------------------------------
 
@@ -372,11 +536,18 @@ class QuizBot:
             await update.message.reply_text("⛔ You're not authorized to end the game.")
             return
 
+        await self.finish_game(context, update.effective_chat.id)
+
+    async def finish_game(self, context: CallbackContext, chat_id: int) -> None:
+        """Stop the game and post the final scores."""
         self.quiz_game.game_active = False
-        await update.message.reply_text("🏁 Game ended!")
+        await self.quiz_game.flush_participate_async()
+        for job in context.job_queue.get_jobs_by_name(f"next_game_{chat_id}"):
+            job.schedule_removal()
+        await context.bot.send_message(chat_id=chat_id, text="🏁 Game ended!")
 
         # Show final scores
-        await self.scores(update, context)
+        await context.bot.send_message(chat_id=chat_id, text=self.format_leaderboard())
 
     #-------------------------------------------------------------------------------
 
@@ -420,10 +591,9 @@ class QuizBot:
 
         if query.data == "confirm_reset":
             try:
-                # Directly write an empty participants list to the file
-                empty_data = []
-                with open(QUIZJOIN_PATH, 'w') as file:
-                    json.dump(empty_data, file, indent=4)
+                # Clear the in-memory list and write it to the file
+                self.quiz_game.save_participate({})
+                await self.quiz_game.flush_participate_async()
                 
                 # Update the message to show success
                 await query.edit_message_text(
@@ -467,175 +637,182 @@ class QuizBot:
             await update.message.reply_text("⛔ You're not authorized for this action.")
             return
 
+        chat_id = update.effective_chat.id
+        # A manual advance replaces any pending automatic one
+        for job in context.job_queue.get_jobs_by_name(f"next_game_{chat_id}"):
+            job.schedule_removal()
+
+        await self.advance_puzzle(context, chat_id)
+
+    async def next_game_job(self, context: CallbackContext) -> None:
+        """Job queue callback that moves to the next puzzle automatically."""
+        if self.quiz_game.game_active:
+            await self.advance_puzzle(context, context.job.chat_id)
+
+    async def advance_puzzle(self, context: CallbackContext, chat_id: int) -> None:
+        """Send the next puzzle to the chat, or end the game when none are left."""
         if not self.quiz_game.game_active:
-            reply_text = "No active game! Use /start_game first."
-            if update.callback_query:
-                await update.callback_query.message.reply_text(reply_text)
-            else:
-                await update.message.reply_text(reply_text)
+            await context.bot.send_message(chat_id=chat_id, text="No active game! Use /start_game first.")
             return
 
-        if not self.quiz_game.puzzle_data:
+        puzzle = self.quiz_game.next_puzzle()
+        if puzzle is None:
             game_over_text = "🏁 No more puzzles available! Game Over! \n press /scores"
-            if update.callback_query:
-                await update.callback_query.message.reply_text(game_over_text)
-                await self.end_game(update, context)
-            else:
-                await update.message.reply_text(game_over_text)
-                await self.end_game(update, context)
+            await context.bot.send_message(chat_id=chat_id, text=game_over_text)
+            await self.finish_game(context, chat_id)
             return
 
-        self.quiz_game.current_puzzle = self.quiz_game.puzzle_data.pop()
+        self.quiz_game.current_puzzle = puzzle
         self.quiz_game.hints_given = 0
         # Reset the puzzle solved flag
         self.quiz_game.puzzle_solved = False
 
-        image_path = os.path.join(IMAGES_DIR, self.quiz_game.current_puzzle['image'])
         try:
-            with open(image_path, 'rb') as img:
-                # Send and pin the new puzzle message
-                puzzle_message = await context.bot.send_photo(
-                    chat_id=update.effective_chat.id,
-                    photo=InputFile(img),
-                    caption="🎯 Guess the image!\n\nUse /hint if you need help with panalty. \n Join Now! /join_participate "
-                )
+            # Send and pin the new puzzle message
+            puzzle_message = await self.send_puzzle_photo(context, chat_id)
+            
+            # Pin the new puzzle message in the background
+            context.application.create_task(
+                self.pin_message(context, chat_id, puzzle_message.message_id)
+            )
                 
-                # Pin the new puzzle message
-                try:
-                    await context.bot.pin_chat_message(
-                        chat_id=update.effective_chat.id,
-                        message_id=puzzle_message.message_id,
-                        disable_notification=True
-                    )
-                except TelegramError as e:
-                    logger.error(f"Failed to pin puzzle message: {e}")
-                    
         except Exception as e:
             logger.error(f"Error sending image: {e}")
             error_text = "Error loading puzzle. Please try again."
-            if update.callback_query:
-                await update.callback_query.message.reply_text(error_text)
-            else:
-                await update.message.reply_text(error_text)
+            await context.bot.send_message(chat_id=chat_id, text=error_text)
+
+    async def send_puzzle_photo(self, context: CallbackContext, chat_id: int):
+        """Send the current puzzle image, reusing Telegram's file_id when known."""
+        image = self.quiz_game.current_puzzle['image']
+        file_id = self.quiz_game.image_file_ids.get(image)
+        if file_id:
+            try:
+                return await context.bot.send_photo(chat_id=chat_id, photo=file_id, caption=PUZZLE_CAPTION)
+            except BadRequest as e:
+                # Stale file_id (e.g. the bot token changed), upload it again
+                logger.warning(f"Cached file_id for {image} rejected: {e}")
+                self.quiz_game.image_file_ids.pop(image, None)
+
+        image_path = os.path.join(IMAGES_DIR, image)
+        image_bytes = await asyncio.to_thread(read_image, image_path)
+        puzzle_message = await context.bot.send_photo(
+            chat_id=chat_id,
+            photo=InputFile(image_bytes, filename=image),
+            caption=PUZZLE_CAPTION
+        )
+        self.quiz_game.image_file_ids[image] = puzzle_message.photo[-1].file_id
+        return puzzle_message
 
     #------------------------------------------------------------------------------------
 
     # Modify the handle_message method to include auto-next game logic
     async def handle_message(self, update: Update, context: CallbackContext) -> None:
+        # Answers in one chat are checked in order; other chats run concurrently
+        async with self.chat_locks[update.effective_chat.id]:
+            await self.check_answer(update, context)
+
+    async def check_answer(self, update: Update, context: CallbackContext) -> None:
         if not self.quiz_game.game_active or not self.quiz_game.current_puzzle:
             return
 
+        # Most chat messages are not the answer, so reject them first;
+        # the string comparison bails out early on a length mismatch
+        answer = update.message.text.strip().lower()
+        expected_answer = self.quiz_game.current_puzzle['answer_lower']
+        if answer != expected_answer:
+            return
+
         # Add a flag to track if the puzzle has already been solved
         if hasattr(self.quiz_game, 'puzzle_solved') and self.quiz_game.puzzle_solved:
             return
 
         username = update.message.from_user.username
-        participants = self.quiz_game.load_participate()
+        participants = self.quiz_game.participants
         
-        if not any(p['username'] == username for p in participants):
+        if username not in participants:
             return
 
-        answer = update.message.text.strip().lower()
-        expected_answer = os.path.splitext(self.quiz_game.current_puzzle['image'])[0].lower()
+        # Mark the puzzle as solved to prevent further point awarding
+        self.quiz_game.puzzle_solved = True
 
-        if answer == expected_answer:
-            # Mark the puzzle as solved to prevent further point awarding
-            self.quiz_game.puzzle_solved = True
-
-            points = POINTS_PER_CORRECT_ANSWER - (self.quiz_game.hints_given * HINT_PENALTY)
-            points = max(points, 0)  # Ensure points don't go negative
-                
-            # Update user's score
-            for p in participants:
-                if p['username'] == username:
-                    p['score'] = p.get('score', 0) + points
-                    break
+        points = POINTS_PER_CORRECT_ANSWER - (self.quiz_game.hints_given * HINT_PENALTY)
+        points = max(points, 0)  # Ensure points don't go negative
             
-            self.quiz_game.save_participate(participants)
-            
-            # Get user's current rank
-            sorted_participants = sorted(participants, key=lambda x: x.get('score', 0), reverse=True)
-            user_rank = next(i + 1 for i, p in enumerate(sorted_participants) if p['username'] == username)
-            
-            # Create congratulations message
-            congrats_message = (
-                "╔══════════════════════╗\n"
-                "║           🥇 FIRST CORRECT! 🥇           ║\n"
-                "╚══════════════════════╝\n\n"
-                f"🏆 @{username} wins this round!\n"
-                f"Answer: {expected_answer}\n\n"
-            )
+        # Update user's score
+        total_score = self.quiz_game.add_score(username, points)
+        
+        # Get user's current rank
+        user_rank = self.quiz_game.get_rank(username)
+        
+        # Create congratulations message
+        congrats_message = (
+            "╔══════════════════════╗\n"
+            "║           🥇 FIRST CORRECT! 🥇           ║\n"
+            "╚══════════════════════╝\n\n"
+            f"🏆 @{username} wins this round!\n"
+            f"Answer: {expected_answer}\n\n"
+        )
 
-            # Add hint usage information
-            if self.quiz_game.hints_given > 0:
-                if points > 0:
-                    congrats_message += (
-                        f"📍 Hints used: {self.quiz_game.hints_given}/{MAX_HINTS}\n"
-                        f"🏆 Points Earned: +{points:.1f}\n"
-                    )
-                else:
-                    congrats_message += (
-                        "❌ No points awarded - all hints used\n"
-                        f"📍 Hints used: {self.quiz_game.hints_given}/{MAX_HINTS}\n"
-                    )
+        # Add hint usage information
+        if self.quiz_game.hints_given > 0:
+            if points > 0:
+                congrats_message += (
+                    f"📍 Hints used: {self.quiz_game.hints_given}/{MAX_HINTS}\n"
+                    f"🏆 Points Earned: +{points:.1f}\n"
+                )
             else:
-                congrats_message += f"🏆 Perfect Score! +{points:.1f} points\n"
+                congrats_message += (
+                    "❌ No points awarded - all hints used\n"
+                    f"📍 Hints used: {self.quiz_game.hints_given}/{MAX_HINTS}\n"
+                )
+        else:
+            congrats_message += f"🏆 Perfect Score! +{points:.1f} points\n"
 
-            congrats_message += (
-                "━━━━━━━━━━━━━━━━━━\n"
-                "📊 Stats Update:\n"
-                f"• Rank: #{user_rank}\n"
-                f"• Total Score: {p['score']}\n"
-            )
+        congrats_message += (
+            "━━━━━━━━━━━━━━━━━━\n"
+            "📊 Stats Update:\n"
+            f"• Rank: #{user_rank}\n"
+            f"• Total Score: {total_score}\n"
+        )
 
-            # Add special effects
-            if points == POINTS_PER_CORRECT_ANSWER:
-                congrats_message += "\n🌟 Perfect Score! No hints used!"
-            elif user_rank == 1:
-                congrats_message += "\n👑 You're in first place!"
-
-            # Add countdown message for next game
-            congrats_message += "\n\n⏳ Next game starts in 60 seconds..."
-
-            # Send main congratulation message
-            await update.message.reply_text(congrats_message)
-
-            # Send celebratory sticker
-        #    try:
-        #        stickers = [
-        #            "CAACAgIAAxkBAAIDHmXFdQ7wmm-sFu6JuqIux3sIcsVzAAJBAQACqCK2G3x_4IZbJSQEMAQ",
-        #            "CAACAgIAAxkBAAIDH2XFdRXMJ_9bHwXpXNxvzyNLAAHUSQACQwEAAqgithtuHEr3ugABrN4wBA",
-        #            "CAACAgIAAxkBAAIDIGXFdRmBnFbB6QxQSuvs9Zv2Y4LSAAJFAQACqCK2GzVR4fZ-giwWMAQ"
-        #        ]
-        #        await context.bot.send_sticker(
-        #            chat_id=update.effective_chat.id,
-        #           sticker=random.choice(stickers)
-        #       )
-        #    except Exception as e:
-        #        logger.error(f"Error sending sticker: {e}")
-
-            # Schedule next game in 60 seconds
-            await self.schedule_next_game(update, context)
+        # Add special effects
+        if points == POINTS_PER_CORRECT_ANSWER:
+            congrats_message += "\n🌟 Perfect Score! No hints used!"
+        elif user_rank == 1:
+            congrats_message += "\n👑 You're in first place!"
+
+        # Add countdown message for next game
+        congrats_message += "\n\n⏳ Next game starts in 60 seconds..."
+
+        # Send main congratulation message
+        await update.message.reply_text(congrats_message)
+
+        # Send celebratory sticker in the background (errors go to PTB's error handlers)
+    #    stickers = (
+    #        "CAACAgIAAxkBAAIDHmXFdQ7wmm-sFu6JuqIux3sIcsVzAAJBAQACqCK2G3x_4IZbJSQEMAQ",
+    #        "CAACAgIAAxkBAAIDH2XFdRXMJ_9bHwXpXNxvzyNLAAHUSQACQwEAAqgithtuHEr3ugABrN4wBA",
+    #        "CAACAgIAAxkBAAIDIGXFdRmBnFbB6QxQSuvs9Zv2Y4LSAAJFAQACqCK2GzVR4fZ-giwWMAQ"
+    #    )
+    #    context.application.create_task(context.bot.send_sticker(
+    #        chat_id=update.effective_chat.id,
+    #        sticker=random.choice(stickers)
+    #    ))
+
+        # Schedule next game in 60 seconds
+        await self.schedule_next_game(update, context)
 
     #----------------------------------------------------------------#
 
     async def schedule_next_game(self, update: Update, context: CallbackContext) -> None:
-        # Cancel any existing scheduled next game task
-        if self.next_game_task:
-            self.next_game_task.cancel()
-
-        # Create a new task to start the next game
-        async def delayed_next_game():
-            # Wait 60 seconds
-            await asyncio.sleep(60)
-            
-            # Check if game is still active
-            if self.quiz_game.game_active:
-                # Simulate an admin call to next_game
-                await self.next_game(update, context)
+        chat_id = update.effective_chat.id
+        name = f"next_game_{chat_id}"
 
-        # Schedule the task
-        self.next_game_task = asyncio.create_task(delayed_next_game())
+        # Cancel any existing scheduled next game job
+        for job in context.job_queue.get_jobs_by_name(name):
+            job.schedule_removal()
+
+        # Start the next game in 60 seconds
+        context.job_queue.run_once(self.next_game_job, NEXT_GAME_DELAY, chat_id=chat_id, name=name)
 
     #------------------------------------------------------------------------------------
 
@@ -646,16 +823,15 @@ class QuizBot:
         await query.answer()
     
         username = query.from_user.username
-        participants = self.quiz_game.load_participate()
+        participants = self.quiz_game.participants
     
-        user_data = next((p for p in participants if p['username'] == username), None)
+        user_data = participants.get(username)
         if not user_data:
             await query.message.reply_text("User data not found!")
             return
 
         # Calculate user stats
-        sorted_participants = sorted(participants, key=lambda x: x.get('score', 0), reverse=True)
-        rank = next(i + 1 for i, p in enumerate(sorted_participants) if p['username'] == username)
+        rank = self.quiz_game.get_rank(username)
         total_participants = len(participants)
     
         stats_message = (
@@ -701,13 +877,49 @@ class QuizBot:
         try:
             # Handle both regular messages and callback queries
             user = update.effective_user
-            return user.username in AUTHORIZED_ADMINS
+            return user.username.lower() in AUTHORIZED_ADMINS
         except AttributeError:
             return False
 
+    async def flush_loop(self) -> None:
+        """Periodically write pending participant changes to file."""
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await self.quiz_game.flush_participate_async()
+            except Exception as e:
+                logger.error(f"Error in periodic flush: {e}")
+
+    async def post_init(self, application: Application) -> None:
+        """Start background tasks once the application is initialized."""
+        self.flush_task = asyncio.create_task(self.flush_loop())
+
+    async def post_shutdown(self, application: Application) -> None:
+        """Stop background tasks and write any pending changes."""
+        if self.flush_task:
+            self.flush_task.cancel()
+            # Let a write already in progress finish before the final flush
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.flush_task
+        await self.quiz_game.flush_participate_async()
+        await asyncio.to_thread(self.quiz_game.save_image_file_ids)
+
     def run(self):
         """Start the bot."""
-        application = Application.builder().token(self.token).build()
+        application = (
+            Application.builder()
+            .token(self.token)
+            .rate_limiter(AIORateLimiter(
+                overall_max_rate=30,
+                overall_time_period=1,
+                group_max_rate=20,
+                group_time_period=60,
+                max_retries=3  # Retry after RetryAfter (429) instead of failing
+            ))
+            .post_init(self.post_init)
+            .post_shutdown(self.post_shutdown)
+            .build()
+        )
 
      # Add handlers
         application.add_handler(CommandHandler("startpalaro", self.start))
@@ -715,10 +927,10 @@ class QuizBot:
         application.add_handler(CommandHandler("join_participate", self.join_participate))
         application.add_handler(CommandHandler("leaderboard", self.scores))
         application.add_handler(CommandHandler("hint", self.hint))
-        application.add_handler(CommandHandler("start_game", self.start_game))
-        application.add_handler(CommandHandler("next_game", self.next_game))
+        application.add_handler(CommandHandler("start_game", self.start_game, block=False))
+        application.add_handler(CommandHandler("next_game", self.next_game, block=False))
         application.add_handler(CommandHandler("reset_scores", self.reset_list))
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
+        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message, block=False))
         application.add_handler(CallbackQueryHandler(self.button_callback))
 
         # Run the application with asyncio support